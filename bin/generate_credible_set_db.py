@@ -5,6 +5,33 @@ import sqlite3
 import duckdb
 import os
 
+# Columns of the per-dataset parquet files written by prepare_batches.py
+CREDIBLE_SET_COLUMNS = (
+    ("study_id", "TEXT"),
+    ("study_label", "TEXT"),
+    ("dataset_id", "TEXT"),
+    ("molecular_trait_id", "TEXT"),
+    ("gene_id", "TEXT"),
+    ("gene_name", "TEXT"),
+    ("variant", "TEXT"),
+    ("rsid", "TEXT"),
+    ("quantification_method", "TEXT"),
+    ("credible_set", "TEXT"),
+    ("credible_set_size", "INTEGER"),
+    ("pip", "FLOAT"),
+    ("pvalue", "FLOAT"),
+    ("beta", "FLOAT"),
+    ("se", "FLOAT"),
+    ("dataset_label", "TEXT"),
+    ("plot_variant", "TEXT"),
+)
+COLUMN_LIST = ", ".join(name for name, _ in CREDIBLE_SET_COLUMNS)
+ALL_COLUMNS = "id, " + COLUMN_LIST
+COLUMN_DEFINITIONS = "id INTEGER PRIMARY KEY NOT NULL, " + ", ".join(
+    f"{name} {col_type}" for name, col_type in CREDIBLE_SET_COLUMNS
+)
+
+
 def create_db_table(sqlite_db:str, parquet_files:list):
     # Set DuckDB home directory and extension path
     os.environ["DUCKDB_HOME"] = "/opt/duckdb_extensions"
@@ -16,36 +43,11 @@ def create_db_table(sqlite_db:str, parquet_files:list):
     con.execute("SET extension_directory = '/opt/duckdb_extensions/extensions';")
     con.execute("LOAD sqlite;")
     con.execute(f"ATTACH '{sqlite_db}' AS sqlite_db (TYPE SQLITE);")
-    con.execute(f"""
-        CREATE TABLE sqlite_db.credible_set_table (
-            id INTEGER PRIMARY KEY NOT NULL,
-            study_id TEXT,
-            study_label TEXT,
-            dataset_id TEXT,
-            molecular_trait_id TEXT,
-            gene_id TEXT,
-            gene_name TEXT,
-            variant TEXT,
-            rsid TEXT,
-            quantification_method TEXT,
-            credible_set TEXT,
-            credible_set_size INTEGER,
-            pip FLOAT,
-            pvalue FLOAT,
-            beta FLOAT,
-            se FLOAT,
-            dataset_label TEXT,
-            plot_variant TEXT
-        );
-    """)
+    con.execute(f"CREATE TABLE sqlite_db.credible_set_table ({COLUMN_DEFINITIONS});")
 
     query = f"""
-        INSERT INTO sqlite_db.credible_set_table (
-              id, study_id, study_label, dataset_id, molecular_trait_id, gene_id, gene_name, 
-            variant, rsid, quantification_method, credible_set, credible_set_size, 
-            pip, pvalue, beta, se, dataset_label, plot_variant
-        ) 
-        SELECT ROW_NUMBER() OVER() AS id ,* FROM read_parquet({parquet_files});
+        INSERT INTO sqlite_db.credible_set_table ({ALL_COLUMNS})
+        SELECT ROW_NUMBER() OVER() AS id, {COLUMN_LIST} FROM read_parquet({parquet_files});
     """
     con.execute(query)
     con.close()
@@ -53,6 +55,10 @@ def create_db_table(sqlite_db:str, parquet_files:list):
 def create_indexes(sqlite_db:str):
     conn = sqlite3.connect(sqlite_db)
     cursor = conn.cursor()
+    # index builds are sort-bound, give the sorter memory instead of temp files
+    cursor.execute("PRAGMA cache_size=-2097152;")  # 2 GiB
+    cursor.execute("PRAGMA temp_store=MEMORY;")
+    cursor.execute("PRAGMA mmap_size=68719476736;")
 
     indexes = [
         "CREATE INDEX idx_molecular_trait_id ON credible_set_table(molecular_trait_id);",
@@ -65,6 +71,7 @@ def create_indexes(sqlite_db:str):
     ]
     for index in indexes:
         cursor.execute(index)
+    cursor.execute("ANALYZE;")
     conn.commit()
     conn.close()
 
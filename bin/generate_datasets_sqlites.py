@@ -3,9 +3,11 @@
 
 import argparse
 import datetime
-from typing import List, Tuple, Any, Optional
+from typing import List, Tuple, Any, Optional, Iterator
 import io
+import os
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
 from math import isnan
 from pathlib import Path
@@ -17,6 +19,9 @@ from pydantic import BaseModel
 SerializedParquet = bytes
 Pydict = dict[str, list[Any]]
 
+# rows hold several serialized parquet blobs, keep the executemany buffer small
+WRITE_BATCH_SIZE = 100
+
 
 def _pydict_to_bytes(data: Pydict) -> SerializedParquet:
     table = pa.Table.from_pydict(data)
@@ -64,11 +69,13 @@ class Metadata(BaseModel):
 
     @classmethod
     def _from_directory(cls, path: Path) -> 'Metadata':  # , *, molecular_trait_id, variant, gene_id
-        molecular_trait_id = get_df_from_directory(path, 'ss_oi_df').loc[0, 'molecular_trait_id']
-        gene_name = get_df_from_directory(path, 'ss_oi_df').loc[0, 'gene_name']
-        credible_set_id = get_df_from_directory(path, 'ss_oi_df').loc[0, 'cs_id']
-        variant = get_df_from_directory(path, 'ss_oi_df').loc[0, 'variant']
-        gene_id = get_df_from_directory(path, 'ss_oi_df').loc[0, 'gene_id']
+        # read the sumstats parquet once rather than once per field
+        ss_oi_df = get_df_from_directory(path, 'ss_oi_df')
+        molecular_trait_id = ss_oi_df.loc[0, 'molecular_trait_id']
+        gene_name = ss_oi_df.loc[0, 'gene_name']
+        credible_set_id = ss_oi_df.loc[0, 'cs_id']
+        variant = ss_oi_df.loc[0, 'variant']
+        gene_id = ss_oi_df.loc[0, 'gene_id']
         x_limit = get_df_from_directory(path, 'tx_str').loc[0, 'limit_max']
 
         # y_limit
@@ -469,7 +476,8 @@ class ApiData(BaseModel):
     @classmethod
     @lru_cache(maxsize=10)
     def from_database(cls, database: str, gene_id: str, molecular_trait_id: str, variant: str) -> Optional['ApiData']:
-        conn = sqlite3.connect(database)
+        # published databases are never modified: immutable=1 skips journal/WAL checks and file locking
+        conn = sqlite3.connect(f"{Path(database).resolve().as_uri()}?mode=ro&immutable=1", uri=True)
 
         # Get the metadata from the metadata table
         cursor_meta = conn.execute("SELECT key, value FROM metadata")
@@ -485,19 +493,20 @@ class ApiData(BaseModel):
         # Get the first (and only) row of the result
         row = cursor.fetchone()
         if row is None:
-
+            # Only gene_id leads an index, the other probes scan main; select a constant so
+            # the serialized blobs (stored in overflow pages) are never read
             # Check if gene_id is present in the database
-            cursor_gene = conn.execute("SELECT * FROM main WHERE gene_id=?", (gene_id,))
+            cursor_gene = conn.execute("SELECT 1 FROM main WHERE gene_id=? LIMIT 1", (gene_id,))
             if cursor_gene.fetchone() is None:
                 raise AssertionError(f"gene_id={gene_id} not found")
 
             # Check if molecular_trait_id is present in the database
-            cursor_phenotype = conn.execute("SELECT * FROM main WHERE molecular_trait_id=?", (molecular_trait_id,))
+            cursor_phenotype = conn.execute("SELECT 1 FROM main WHERE molecular_trait_id=? LIMIT 1", (molecular_trait_id,))
             if cursor_phenotype.fetchone() is None:
                 raise AssertionError(f"molecular_trait_id={molecular_trait_id} not found")
 
             # Check if variant is present in the database
-            cursor_variant = conn.execute("SELECT * FROM main WHERE variant=?", (variant,))
+            cursor_variant = conn.execute("SELECT 1 FROM main WHERE variant=? LIMIT 1", (variant,))
             if cursor_variant.fetchone() is None:
                 raise AssertionError(f"variant={variant} not found")
 
@@ -559,8 +568,13 @@ def get_df_from_directory(dir_path: Path, df_name: str):
     valid_df_names = ['nom_exon_cc', 'box_plot_df', 'tx_str', 'ss_oi_df', 'coverage_df']
     assert df_name in valid_df_names, f"'{df_name}' is not a valid dataframe name. Must be one of {valid_df_names}"
     # Search for the file starting with df_name in the directory
+    # scandir gets names from readdir directly instead of building a Path per entry like glob does
     dir_path = Path(dir_path)
-    matching_files = list(dir_path.glob(f"{df_name}_*.parquet"))
+    prefix = f"{df_name}_"
+    with os.scandir(dir_path) as entries:
+        matching_files = [Path(entry.path) for entry in entries
+                          if entry.name.startswith(prefix) and entry.name.endswith('.parquet')
+                          and entry.is_file()]
     if not matching_files:
         raise FileNotFoundError(f"No file found in directory '{dir_path}' starting with '{df_name}'")
     if len(matching_files) > 1:
@@ -570,10 +584,25 @@ def get_df_from_directory(dir_path: Path, df_name: str):
     return df
 
 
+def tune_connection(conn: sqlite3.Connection) -> None:
+    """Apply bulk-load PRAGMAs to a connection on a freshly built database."""
+    # the database is a build artifact: if the task dies, Nextflow reruns it from scratch,
+    # so durability is traded for fewer fsyncs and larger page cache
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA locking_mode=EXCLUSIVE')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-1048576')  # 1 GiB
+    conn.execute('PRAGMA mmap_size=34359738368')
+
+
 def initialize_database(conn_path: str | Path) -> None:
     """Initialize the database with main and metadata tables."""
     # Create a connection to the database
     conn = sqlite3.connect(conn_path)
+    # Rows are mostly serialized parquet blobs, large pages keep them off overflow chains.
+    # page_size only takes effect before the first table is created.
+    conn.execute('PRAGMA page_size=65536')
     # Create the main table
     conn.execute('''CREATE TABLE main
                  (id INTEGER PRIMARY KEY,
@@ -617,14 +646,13 @@ def initialize_database(conn_path: str | Path) -> None:
 
 
 def write_batch_data_to_main_table(conn: sqlite3.Connection, data_list: List[Tuple]) -> None:
-    """Insert a batch of serialized API data into the main table."""
+    """Insert a batch of serialized API data into the main table. The caller commits."""
     # Insert the data into the main table using executemany
     conn.executemany('''INSERT INTO main 
     (dataset_id, credible_set_id, gene_id, molecular_trait_id, variant, gene_name, x_limit, y_limit, tx_structure_serialized, coverage_serialized, nom_exon_cc_serialized, box_plot_df_serialized) 
     VALUES
     (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) 
     ''', data_list)
-    conn.commit()
 
 
 def process_directory_files(directory_path: Path) -> SerializedApiData:
@@ -638,9 +666,8 @@ def process_directory_files(directory_path: Path) -> SerializedApiData:
         raise
 
 
-def process_and_write(directory_containing_pqs, conn, dataset_id):
-    data = process_directory_files(directory_path=directory_containing_pqs)
-    output_row = (
+def to_main_table_row(data: SerializedApiData, dataset_id: str) -> Tuple:
+    return (
         dataset_id,
         data.credible_set_id,
         data.gene_id,
@@ -654,16 +681,38 @@ def process_and_write(directory_containing_pqs, conn, dataset_id):
         data.nom_exon_cc_serialized,
         data.box_plot_df_serialized
     )
-    write_batch_data_to_main_table(conn, [output_row])
 
 
-def main(dataset_id, dir_paths) -> None:
-    dir_paths_df = pd.read_csv(dir_paths, header=None, names=["path"])
+def iter_directory_paths(list_file: str | Path) -> Iterator[Path]:
+    """Yield the directory paths listed one per line in list_file, skipping blank lines."""
+    # read lazily so workers can start on the first directories while the list is still being read;
+    # a missing directory fails in get_df_from_directory, no need to stat every entry upfront
+    with open(list_file, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield Path(line)
+
+
+def main(dataset_id, dir_paths, n_workers=1) -> None:
     TARGET_DB = f'{dataset_id}.sqlite'
     initialize_database(TARGET_DB)
     conn = sqlite3.connect(TARGET_DB)
-    dir_paths_df['path'].apply(lambda x: process_and_write(x, conn, dataset_id))
-    conn.execute('''CREATE INDEX idx_main_gene_pheno_var ON main(gene_id, molecular_trait_id, variant)''')
+    tune_connection(conn)
+    # directories are independent, parse and serialize them in worker processes
+    # and keep all writes on the single connection owned by this process
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        batch = []
+        for data in executor.map(process_directory_files, iter_directory_paths(dir_paths)):
+            batch.append(to_main_table_row(data, dataset_id))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                write_batch_data_to_main_table(conn, batch)
+                batch = []
+        if batch:
+            write_batch_data_to_main_table(conn, batch)
+    # all rows go in as one transaction, committed once after analyze.
+    # Lookups on (gene_id, molecular_trait_id, variant) are served by the index SQLite builds
+    # for the UNIQUE constraint, a separate index on the same columns would only duplicate it.
     conn.execute('analyze')
     conn.commit()
     conn.close()
@@ -674,8 +723,10 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--dataset_id', required=True, type=str, help="Dataset ID")
     parser.add_argument('-s', '--source_root_file', required=True, type=str,
                         help="File with  paths to the directories containing parquet files.")
+    parser.add_argument('-w', '--workers', required=False, type=int, default=1,
+                        help="Number of worker processes used to serialize the directories.")
 
     args = parser.parse_args()
     dataset_id = args.dataset_id
     source_roots = args.source_root_file
-    main(dataset_id, source_roots)
\ No newline at end of file
+    main(dataset_id, source_roots, args.workers)
\ No newline at end of file
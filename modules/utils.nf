@@ -76,7 +76,8 @@ process generate_dataset_ids_sqlites {
     """
     $projectDir/bin/generate_datasets_sqlites.py \
         -d $dataset_id \
-        -s $directory_paths 
+        -s $directory_paths \
+        -w ${task.cpus}
     """
 }
 